@@ -1,31 +1,128 @@
 import os
-import json
 import time
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
 from typing import Optional, Dict, Any
 
+import orjson
 import requests
 from dotenv import load_dotenv
-
-load_dotenv()
-
-TE_API_TOKEN = os.getenv("TE_API_TOKEN")
-TEST_NAME = os.getenv("TEST_NAME")
-TARGET = os.getenv("TARGET")
+from requests.adapters import HTTPAdapter
+from requests.utils import DEFAULT_ACCEPT_ENCODING
+from urllib3.util.retry import Retry
 
 BASE_URL = "https://api.thousandeyes.com/v7"
+AGENTS_URL = f"{BASE_URL}/agents"
+HTTP_SERVER_TESTS_URL = f"{BASE_URL}/tests/http-server"
+TEST_RESULTS_URL = f"{BASE_URL}/test-results/{{test_id}}/http-server"
 HEADERS = {
-    "Authorization": f"Bearer {TE_API_TOKEN}",
     "Content-Type": "application/json",
+    "Accept-Encoding": DEFAULT_ACCEPT_ENCODING,
 }
+REQUEST_TIMEOUT = 30
+RETRY_STRATEGY = Retry(
+    total=3,
+    backoff_factor=1,
+    status_forcelist=(429, 500, 502, 503, 504),
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+
+
+@dataclass(frozen=True)
+class Config:
+    te_api_token: Optional[str]
+    test_name: Optional[str]
+    target: Optional[str]
+
+
+@lru_cache(maxsize=1)
+def get_config() -> Config:
+    load_dotenv()
+    return Config(
+        te_api_token=os.getenv("TE_API_TOKEN"),
+        test_name=os.getenv("TEST_NAME"),
+        target=os.getenv("TARGET"),
+    )
+
+
+def bearer_auth(request: requests.PreparedRequest) -> requests.PreparedRequest:
+    request.headers["Authorization"] = f"Bearer {get_config().te_api_token}"
+    return request
+
+
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.auth = bearer_auth
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=4,
+        pool_block=True,
+        max_retries=RETRY_STRATEGY,
+    ),
+)
+
+
+@dataclass(slots=True)
+class HttpResult:
+    agent: Optional[Dict[str, Any]]
+    date: Optional[str]
+    responseCode: Optional[int]
+    responseTime: Optional[int]
+    redirectTime: Optional[int]
+    dnsTime: Optional[int]
+    sslTime: Optional[int]
+    connectTime: Optional[int]
+    waitTime: Optional[int]
+    receiveTime: Optional[int]
+    totalTime: Optional[int]
+    throughput: Optional[int]
+    wireSize: Optional[int]
+    serverIp: Optional[str]
+    sslCipher: Optional[str]
+    sslVersion: Optional[str]
+    healthScore: Optional[float]
+
+    @classmethod
+    def from_dict(cls, result: Dict[str, Any]) -> "HttpResult":
+        return cls(**{name: result.get(name) for name in cls.__dataclass_fields__})
+
+
+RESULT_TEMPLATE = """
+========== HTTP SERVER TEST RESULTS ==========
+ Test Name     : {config.test_name}
+ Agent         : {r.agent[agentName]} (ID: {r.agent[agentId]})
+ Test Date     : {r.date}
+ Target URL    : {config.target}
+----------------------------------------------
+ Response Code : {r.responseCode}
+ Response Time : {r.responseTime} ms
+ Redirect Time : {r.redirectTime} ms
+ DNS Time      : {r.dnsTime} ms
+ SSL Time      : {r.sslTime} ms
+ Connect Time  : {r.connectTime} ms
+ Wait Time     : {r.waitTime} ms
+ Receive Time  : {r.receiveTime} ms
+ Total Time    : {r.totalTime} ms
+ Throughput    : {r.throughput} bytes/sec
+ Wire Size     : {r.wireSize} bytes
+ Server IP     : {r.serverIp}
+ SSL Cipher    : {r.sslCipher}
+ SSL Version   : {r.sslVersion}
+ Health Score  : {r.healthScore:.4f}
+==============================================
+"""
 
 
 def get_first_agent_id() -> Optional[int]:
-    url = f"{BASE_URL}/agents"
-    response = requests.get(url, headers=HEADERS)
+    response = SESSION.get(AGENTS_URL, timeout=REQUEST_TIMEOUT)
 
     if response.ok:
-        agents = response.json().get("agents", [])
+        agents = orjson.loads(response.content).get("agents", [])
         if agents:
             agent = agents[0]
             print(f"[✓] Using agent: {agent['agentName']} (ID: {agent['agentId']})")
@@ -38,13 +135,14 @@ def get_first_agent_id() -> Optional[int]:
 
 
 def find_existing_test_id(test_name: str) -> Optional[int]:
-    url = f"{BASE_URL}/tests/http-server"
-    response = requests.get(url, headers=HEADERS)
+    response = SESSION.get(HTTP_SERVER_TESTS_URL, timeout=REQUEST_TIMEOUT)
 
     if response.ok:
-        for test in response.json().get("tests", []):
-            if test.get("testName") == test_name:
-                return int(test["testId"])
+        tests = orjson.loads(response.content).get("tests", [])
+        tests_by_name = {test.get("testName"): test for test in reversed(tests)}
+        test = tests_by_name.get(test_name)
+        if test is not None:
+            return int(test["testId"])
     else:
         print(f"[!] Failed to retrieve tests: {response.status_code} - {response.text}")
     return None
@@ -63,11 +161,12 @@ def create_test(
         "agents": [{"agentId": agent_id}],
     }
 
-    url = f"{BASE_URL}/tests/http-server"
-    response = requests.post(url, headers=HEADERS, json=payload)
+    response = SESSION.post(
+        HTTP_SERVER_TESTS_URL, json=payload, timeout=REQUEST_TIMEOUT
+    )
 
     if response.status_code == 201:
-        test_id = response.json().get("testId")
+        test_id = orjson.loads(response.content).get("testId")
         print(f"[+] Created test '{test_name}' (ID: {test_id})")
         return int(test_id)
     else:
@@ -76,12 +175,12 @@ def create_test(
 
 
 def get_test_results(test_id: int) -> Optional[Dict[str, Any]]:
-    url = f"{BASE_URL}/test-results/{test_id}/http-server"
-    response = requests.get(url, headers=HEADERS)
+    url = TEST_RESULTS_URL.format(test_id=test_id)
+    response = SESSION.get(url, timeout=REQUEST_TIMEOUT)
 
     if response.ok:
         print(f"[+] Fetched test results for test ID {test_id}")
-        return response.json()
+        return orjson.loads(response.content)
     else:
         print(
             f"[!] Failed to retrieve test results: {response.status_code} - {response.text}"
@@ -89,73 +188,98 @@ def get_test_results(test_id: int) -> Optional[Dict[str, Any]]:
         return None
 
 
+def wait_for_test_results(
+    test_id: int, timeout: float = 120, delay: float = 0.5, max_delay: float = 10
+) -> Optional[Dict[str, Any]]:
+    url = TEST_RESULTS_URL.format(test_id=test_id)
+    deadline = time.monotonic() + timeout
+    etag = None
+
+    while True:
+        headers = {"If-None-Match": etag} if etag else None
+        response = SESSION.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+
+        if response.status_code == 304:
+            pass
+        elif response.ok:
+            etag = response.headers.get("ETag")
+            results = orjson.loads(response.content)
+            if results.get("results"):
+                print(f"[+] Fetched test results for test ID {test_id}")
+                return results
+        elif response.status_code != 404:
+            print(
+                f"[!] Failed to retrieve test results: {response.status_code} - {response.text}"
+            )
+            return None
+
+        if time.monotonic() + delay > deadline:
+            print(f"[!] Timed out after {timeout} seconds waiting for test results.")
+            return None
+        time.sleep(delay)
+        delay = min(delay * 1.3, max_delay)
+
+
 def analyze_results(results: Dict[str, Any]) -> None:
     entries = results.get("results", [])
     if not entries:
         print("[!] No HTTP Server test results available.")
         return
 
-    result = entries[0]
-    print("\n========== HTTP SERVER TEST RESULTS ==========")
-    print(f" Test Name     : {TEST_NAME}")
-    print(
-        f" Agent         : {result['agent']['agentName']} (ID: {result['agent']['agentId']})"
-    )
-    print(f" Test Date     : {result['date']}")
-    print(f" Target URL    : {TARGET}")
-    print("----------------------------------------------")
-    print(f" Response Code : {result.get('responseCode')}")
-    print(f" Response Time : {result.get('responseTime')} ms")
-    print(f" Redirect Time : {result.get('redirectTime')} ms")
-    print(f" DNS Time      : {result.get('dnsTime')} ms")
-    print(f" SSL Time      : {result.get('sslTime')} ms")
-    print(f" Connect Time  : {result.get('connectTime')} ms")
-    print(f" Wait Time     : {result.get('waitTime')} ms")
-    print(f" Receive Time  : {result.get('receiveTime')} ms")
-    print(f" Total Time    : {result.get('totalTime')} ms")
-    print(f" Throughput    : {result.get('throughput')} bytes/sec")
-    print(f" Wire Size     : {result.get('wireSize')} bytes")
-    print(f" Server IP     : {result.get('serverIp')}")
-    print(f" SSL Cipher    : {result.get('sslCipher')}")
-    print(f" SSL Version   : {result.get('sslVersion')}")
-    print(f" Health Score  : {result.get('healthScore'):.4f}")
-    print("==============================================\n")
-
-
-def save_report(test_name: str, results: Dict[str, Any]) -> None:
+    result = HttpResult.from_dict(entries[0])
+    print(RESULT_TEMPLATE.format(r=result, config=get_config()))
+
+
+def save_report(test_name: str, results: Dict[str, Any], pretty: bool = False) -> None:
     filename = f"{test_name}_report.json"
-    with open(filename, "w") as f:
-        json.dump(results, f, indent=2)
+    option = orjson.OPT_INDENT_2 if pretty else None
+    with open(filename, "wb") as f:
+        f.write(orjson.dumps(results, option=option))
     print(f"[✓] Report saved to: {filename}")
 
 
-if __name__ == "__main__":
+def main() -> None:
     print("[*] Starting ThousandEyes test automation...")
 
-    agent_id = get_first_agent_id()
+    config = get_config()
+    if not all([config.te_api_token, config.test_name, config.target]):
+        sys.exit("[!] TE_API_TOKEN, TEST_NAME and TARGET must be set. Exiting.")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        agent_future = executor.submit(get_first_agent_id)
+        test_future = executor.submit(find_existing_test_id, config.test_name)
+        agent_id = agent_future.result()
+        test_id = test_future.result()
+
     if agent_id is None:
         sys.exit("[!] No valid agent available. Exiting.")
 
-    test_id = find_existing_test_id(TEST_NAME)
     is_new = False
 
     if test_id is not None:
         print(f"[✓] Found existing test ID: {test_id}")
     else:
-        print(f"[*] No existing test named '{TEST_NAME}' found. Creating a new test...")
-        test_id = create_test(TEST_NAME, TARGET, agent_id)
+        print(
+            f"[*] No existing test named '{config.test_name}' found. Creating a new test..."
+        )
+        test_id = create_test(config.test_name, config.target, agent_id)
         is_new = True
 
     if test_id is None:
         sys.exit("[!] Test creation failed. Exiting.")
 
     if is_new:
-        print("[*] Waiting 90 seconds for the first test result to become available...")
-        time.sleep(90)
+        print("[*] Waiting for the first test result to become available...")
+        results = wait_for_test_results(test_id)
+    else:
+        results = get_test_results(test_id)
 
-    results = get_test_results(test_id)
     if results:
         analyze_results(results)
-        save_report(TEST_NAME, results)
+        save_report(config.test_name, results)
     else:
         sys.exit("[!] No results returned. Exiting.")
+
+
+if __name__ == "__main__":
+    main()
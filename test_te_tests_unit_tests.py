@@ -1,179 +1,279 @@
-import unittest
-from unittest.mock import patch, MagicMock, mock_open
+import os
+from types import MappingProxyType, SimpleNamespace
+from unittest.mock import patch, mock_open
+
+import orjson
+import pytest
 
 from te_tests import (
+    SESSION,
+    BASE_URL,
+    get_config,
+    bearer_auth,
+    HttpResult,
     get_first_agent_id,
     find_existing_test_id,
     create_test,
     get_test_results,
+    wait_for_test_results,
     analyze_results,
     save_report,
 )
 
 
 class TestData:
-    AGENT_DATA = {
-        "agents": [{"agentId": "3", "agentName": "Singapore", "countryId": "SG"}]
-    }
-
-    TESTS_DATA = {
-        "tests": [
-            {
-                "interval": 3600,
+    AGENT_DATA = orjson.dumps(
+        {"agents": [{"agentId": "3", "agentName": "Singapore", "countryId": "SG"}]}
+    )
+
+    TESTS_DATA = orjson.dumps(
+        {
+            "tests": [
+                {
+                    "interval": 3600,
+                    "testId": "6969142",
+                    "testName": "Cisco.com Test",
+                    "createdBy": "Student (student@cisco.com)",
+                    "createdDate": "2025-04-10T13:42:26Z",
+                    "type": "http-server",
+                    "enabled": True,
+                    "url": "https://cisco.com",
+                }
+            ]
+        }
+    )
+
+    TEST_RESULTS = orjson.dumps(
+        {
+            "test": {
                 "testId": "6969142",
                 "testName": "Cisco.com Test",
-                "createdBy": "Student (student@cisco.com)",
-                "createdDate": "2025-04-10T13:42:26Z",
                 "type": "http-server",
-                "enabled": True,
                 "url": "https://cisco.com",
-            }
-        ]
-    }
-
-    TEST_RESULTS = {
-        "test": {
-            "testId": "6969142",
-            "testName": "Cisco.com Test",
-            "type": "http-server",
-            "url": "https://cisco.com",
-        },
-        "results": [
-            {
-                "agent": {"agentId": "3", "agentName": "Singapore", "countryId": "SG"},
-                "date": "2025-04-10T15:20:39Z",
-                "responseCode": 200,
-                "dnsTime": 90,
-                "sslTime": 8,
-                "connectTime": 4,
-                "waitTime": 23,
-                "receiveTime": 1,
-                "responseTime": 125,
-                "serverIp": "23.54.57.29",
-                "healthScore": 0.99988276,
-            }
-        ],
-    }
-
-    ENV = {
-        "TE_API_TOKEN": "mock-token-123",
-        "TEST_NAME": "Cisco.com Test",
-        "TARGET": "https://cisco.com",
-    }
-
-
-class BaseTestCase(unittest.TestCase):
-    def setUp(self):
-        self.env_patcher = patch("os.getenv")
-        self.mock_getenv = self.env_patcher.start()
-        self.mock_getenv.side_effect = lambda key: TestData.ENV.get(key)
-
-        self.success_response = MagicMock()
-        self.success_response.ok = True
-
-        self.error_response = MagicMock()
-        self.error_response.ok = False
-        self.error_response.status_code = 500
-        self.error_response.text = "API Error"
-
-    def tearDown(self):
-        self.env_patcher.stop()
-
-
-class TestGetFirstAgentId(BaseTestCase):
-    @patch("requests.get")
-    def test_successful_agent_retrieval(self, mock_get):
-        self.success_response.json.return_value = TestData.AGENT_DATA
-        mock_get.return_value = self.success_response
-        agent_id = get_first_agent_id()
-        self.assertEqual(agent_id, 3)
-        mock_get.assert_called_once()
-
-    @patch("requests.get")
-    def test_no_agents_found(self, mock_get):
-        self.success_response.json.return_value = {"agents": []}
-        mock_get.return_value = self.success_response
-        agent_id = get_first_agent_id()
-        self.assertIsNone(agent_id)
-        mock_get.assert_called_once()
-
-    @patch("requests.get")
-    def test_api_error(self, mock_get):
-        mock_get.return_value = self.error_response
-        agent_id = get_first_agent_id()
-        self.assertIsNone(agent_id)
-        mock_get.assert_called_once()
-
-
-class TestFindExistingTestId(BaseTestCase):
-    @patch("requests.get")
-    def test_find_existing_test(self, mock_get):
-        self.success_response.json.return_value = TestData.TESTS_DATA
-        mock_get.return_value = self.success_response
-        test_id = find_existing_test_id("Cisco.com Test")
-        self.assertEqual(test_id, 6969142)
-        mock_get.assert_called_once()
-
-    @patch("requests.get")
-    def test_test_not_found(self, mock_get):
-        self.success_response.json.return_value = {
-            "tests": [{"testId": "7890123", "testName": "Different Test"}]
+            },
+            "results": [
+                {
+                    "agent": {
+                        "agentId": "3",
+                        "agentName": "Singapore",
+                        "countryId": "SG",
+                    },
+                    "date": "2025-04-10T15:20:39Z",
+                    "responseCode": 200,
+                    "dnsTime": 90,
+                    "sslTime": 8,
+                    "connectTime": 4,
+                    "waitTime": 23,
+                    "receiveTime": 1,
+                    "responseTime": 125,
+                    "serverIp": "23.54.57.29",
+                    "healthScore": 0.99988276,
+                }
+            ],
         }
-        mock_get.return_value = self.success_response
-        test_id = find_existing_test_id("Cisco.com Test")
-        self.assertIsNone(test_id)
-        mock_get.assert_called_once()
-
-    @patch("requests.get")
-    def test_api_error(self, mock_get):
-        mock_get.return_value = self.error_response
-        test_id = find_existing_test_id("Cisco.com Test")
-        self.assertIsNone(test_id)
-        mock_get.assert_called_once()
-
-
-class TestCreateTest(BaseTestCase):
-    @patch("requests.post")
-    def test_successful_test_creation(self, mock_post):
-        self.success_response.status_code = 201
-        self.success_response.json.return_value = {"testId": "6969142"}
-        mock_post.return_value = self.success_response
-        test_id = create_test("Cisco.com Test", "https://cisco.com", 3)
-        self.assertEqual(test_id, 6969142)
-        mock_post.assert_called_once()
-
-    @patch("requests.post")
-    def test_api_error(self, mock_post):
-        self.error_response.status_code = 400
-        mock_post.return_value = self.error_response
-        test_id = create_test("Cisco.com Test", "https://cisco.com", 3)
-        self.assertIsNone(test_id)
-        mock_post.assert_called_once()
-
-
-class TestGetTestResults(BaseTestCase):
-    @patch("requests.get")
-    def test_successful_results_retrieval(self, mock_get):
-        self.success_response.json.return_value = TestData.TEST_RESULTS
-        mock_get.return_value = self.success_response
-        results = get_test_results(6969142)
-        self.assertEqual(results, TestData.TEST_RESULTS)
-        mock_get.assert_called_once()
-
-    @patch("requests.get")
-    def test_api_error(self, mock_get):
-        self.error_response.status_code = 404
-        mock_get.return_value = self.error_response
-        results = get_test_results(9999999)
-        self.assertIsNone(results)
-        mock_get.assert_called_once()
-
-
-class TestAnalyzeResults(BaseTestCase):
-    @patch("sys.stdout", new_callable=MagicMock)
-    def test_analyze_valid_results(self, mock_stdout):
-        analyze_results(TestData.TEST_RESULTS)
-        output = "".join([call[0][0] for call in mock_stdout.write.call_args_list])
+    )
+
+    ENV = MappingProxyType(
+        {
+            "TE_API_TOKEN": "mock-token-123",
+            "TEST_NAME": "Cisco.com Test",
+            "TARGET": "https://cisco.com",
+        }
+    )
+
+
+def make_response(status_code=200, payload=None, headers=None):
+    content = payload if isinstance(payload, bytes) else orjson.dumps(payload)
+    return SimpleNamespace(
+        ok=status_code < 400,
+        status_code=status_code,
+        content=content,
+        text=content.decode(),
+        headers=headers or {},
+    )
+
+
+@pytest.fixture(scope="module", autouse=True)
+def env():
+    with patch.dict(os.environ, TestData.ENV):
+        get_config.cache_clear()
+        yield
+    get_config.cache_clear()
+
+
+@pytest.fixture(scope="module")
+def mock_session():
+    with patch("te_tests.SESSION") as session:
+        yield session
+
+
+@pytest.fixture(autouse=True)
+def reset_mock_session(mock_session):
+    mock_session.reset_mock(return_value=True, side_effect=True)
+
+
+class TestConfig:
+    def test_config_read_from_environment(self):
+        config = get_config()
+        assert config.te_api_token == "mock-token-123"
+        assert config.test_name == "Cisco.com Test"
+        assert config.target == "https://cisco.com"
+        assert get_config() is config
+
+    def test_bearer_auth_sets_authorization_header(self):
+        request = bearer_auth(SimpleNamespace(headers={}))
+        assert request.headers["Authorization"] == "Bearer mock-token-123"
+
+
+class TestSession:
+    def test_compressed_responses_accepted(self):
+        assert "gzip" in SESSION.headers["Accept-Encoding"]
+
+    def test_adapter_retries_throttled_and_server_errors(self):
+        retries = SESSION.get_adapter(BASE_URL).max_retries
+        assert retries.respect_retry_after_header
+        assert not retries.raise_on_status
+        assert 429 in retries.status_forcelist
+        assert "POST" not in retries.allowed_methods
+
+
+class TestGetFirstAgentId:
+    @pytest.mark.parametrize(
+        "status_code, payload, expected",
+        [
+            (200, TestData.AGENT_DATA, 3),
+            (200, {"agents": []}, None),
+            (500, None, None),
+        ],
+        ids=["found", "no_agents", "api_error"],
+    )
+    def test_get_first_agent_id(self, mock_session, status_code, payload, expected):
+        mock_session.get.return_value = make_response(status_code, payload)
+        assert get_first_agent_id() == expected
+        mock_session.get.assert_called_once()
+
+
+class TestFindExistingTestId:
+    @pytest.mark.parametrize(
+        "status_code, payload, expected",
+        [
+            (200, TestData.TESTS_DATA, 6969142),
+            (
+                200,
+                {
+                    "tests": [
+                        {"testId": "6969142", "testName": "Cisco.com Test"},
+                        {"testId": "7890123", "testName": "Cisco.com Test"},
+                    ]
+                },
+                6969142,
+            ),
+            (
+                200,
+                {"tests": [{"testId": "7890123", "testName": "Different Test"}]},
+                None,
+            ),
+            (500, None, None),
+        ],
+        ids=["found", "first_match_wins", "not_found", "api_error"],
+    )
+    def test_find_existing_test_id(self, mock_session, status_code, payload, expected):
+        mock_session.get.return_value = make_response(status_code, payload)
+        assert find_existing_test_id("Cisco.com Test") == expected
+        mock_session.get.assert_called_once()
+
+
+class TestCreateTest:
+    @pytest.mark.parametrize(
+        "status_code, payload, expected",
+        [
+            (201, {"testId": "6969142"}, 6969142),
+            (400, None, None),
+        ],
+        ids=["created", "api_error"],
+    )
+    def test_create_test(self, mock_session, status_code, payload, expected):
+        mock_session.post.return_value = make_response(status_code, payload)
+        assert create_test("Cisco.com Test", "https://cisco.com", 3) == expected
+        mock_session.post.assert_called_once()
+
+
+class TestGetTestResults:
+    @pytest.mark.parametrize(
+        "status_code, payload, expected",
+        [
+            (200, TestData.TEST_RESULTS, orjson.loads(TestData.TEST_RESULTS)),
+            (404, None, None),
+        ],
+        ids=["fetched", "api_error"],
+    )
+    def test_get_test_results(self, mock_session, status_code, payload, expected):
+        mock_session.get.return_value = make_response(status_code, payload)
+        assert get_test_results(6969142) == expected
+        mock_session.get.assert_called_once()
+
+
+class TestWaitForTestResults:
+    @patch("time.sleep")
+    def test_results_ready_after_polling(self, mock_sleep, mock_session):
+        mock_session.get.side_effect = [
+            make_response(404),
+            make_response(200, TestData.TEST_RESULTS),
+        ]
+        results = wait_for_test_results(6969142)
+        assert results == orjson.loads(TestData.TEST_RESULTS)
+        assert mock_session.get.call_count == 2
+        mock_sleep.assert_called_once_with(0.5)
+
+    @patch("time.sleep")
+    def test_conditional_polling_with_etag(self, mock_sleep, mock_session):
+        mock_session.get.side_effect = [
+            make_response(200, {"results": []}, headers={"ETag": '"abc123"'}),
+            make_response(304),
+            make_response(200, TestData.TEST_RESULTS),
+        ]
+        results = wait_for_test_results(6969142)
+        assert results == orjson.loads(TestData.TEST_RESULTS)
+        sent_headers = [
+            call.kwargs["headers"] for call in mock_session.get.call_args_list
+        ]
+        assert sent_headers == [
+            None,
+            {"If-None-Match": '"abc123"'},
+            {"If-None-Match": '"abc123"'},
+        ]
+
+    @patch("time.sleep")
+    def test_api_error(self, mock_sleep, mock_session):
+        mock_session.get.return_value = make_response(500)
+        results = wait_for_test_results(6969142)
+        assert results is None
+        mock_session.get.assert_called_once()
+        mock_sleep.assert_not_called()
+
+    @patch("time.monotonic")
+    @patch("time.sleep")
+    def test_timeout(self, mock_sleep, mock_monotonic, mock_session):
+        mock_monotonic.side_effect = [0, 60, 125]
+        mock_session.get.return_value = make_response(200, {"results": []})
+        results = wait_for_test_results(6969142)
+        assert results is None
+        assert mock_session.get.call_count == 2
+
+
+class TestHttpResult:
+    def test_from_dict(self):
+        result = HttpResult.from_dict(orjson.loads(TestData.TEST_RESULTS)["results"][0])
+        assert result.agent["agentName"] == "Singapore"
+        assert result.responseCode == 200
+        assert result.healthScore == 0.99988276
+        assert result.sslCipher is None
+
+
+class TestAnalyzeResults:
+    def test_analyze_valid_results(self, capsys):
+        analyze_results(orjson.loads(TestData.TEST_RESULTS))
+        output = capsys.readouterr().out
         expected_elements = [
             "HTTP SERVER TEST RESULTS",
             "Singapore",
@@ -181,29 +281,32 @@ class TestAnalyzeResults(BaseTestCase):
             "Response Time : 125 ms",
             "DNS Time      : 90 ms",
             "Server IP     : 23.54.57.29",
+            "Health Score  : 0.9999",
         ]
         for element in expected_elements:
-            self.assertIn(element, output)
-        self.assertRegex(output, r"Health Score\s+:\s+0\.9999")
+            assert element in output
 
-    @patch("sys.stdout", new_callable=MagicMock)
-    def test_analyze_empty_results(self, mock_stdout):
+    def test_analyze_empty_results(self, capsys):
         analyze_results({"results": []})
-        output = "".join([call[0][0] for call in mock_stdout.write.call_args_list])
-        self.assertIn("No HTTP Server test results available.", output)
+        output = capsys.readouterr().out
+        assert "No HTTP Server test results available." in output
+
 
+class TestSaveReport:
+    @pytest.fixture
+    def mock_file_open(self):
+        with patch("builtins.open", mock_open()) as mocked:
+            yield mocked
 
-class TestSaveReport(BaseTestCase):
-    @patch("builtins.open", new_callable=mock_open)
-    @patch("json.dump")
-    def test_save_report(self, mock_json_dump, mock_file_open):
-        save_report("Cisco.com Test", TestData.TEST_RESULTS)
-        mock_file_open.assert_called_once_with("Cisco.com Test_report.json", "w")
-        mock_json_dump.assert_called_once()
-        args, kwargs = mock_json_dump.call_args
-        self.assertEqual(args[0], TestData.TEST_RESULTS)
-        self.assertEqual(kwargs["indent"], 2)
+    def test_save_report(self, mock_file_open):
+        save_report("Cisco.com Test", orjson.loads(TestData.TEST_RESULTS))
+        mock_file_open.assert_called_once_with("Cisco.com Test_report.json", "wb")
+        mock_file_open().write.assert_called_once_with(TestData.TEST_RESULTS)
 
+    def test_save_pretty_report(self, mock_file_open):
+        results = orjson.loads(TestData.TEST_RESULTS)
+        save_report("Cisco.com Test", results, pretty=True)
+        mock_file_open().write.assert_called_once_with(
+            orjson.dumps(results, option=orjson.OPT_INDENT_2)
+        )
 
-if __name__ == "__main__":
-    unittest.main()